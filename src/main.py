@@ -1,19 +1,29 @@
 import json
 import logging
 import time
-import gc
 import os
+import io
+import gzip
+import queue
+import random
+import tempfile
+from contextlib import contextmanager
+from http.client import HTTPException
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from google.cloud import bigquery
 from google.cloud import storage
+from google.api_core.exceptions import NotFound
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from google.auth import default
-from google.auth.transport.requests import Request
+from google.auth.exceptions import TransportError
 import google_auth_httplib2
 import httplib2
-import pandas as pd
-from datetime import datetime
+import orjson
+from datetime import datetime, timedelta, timezone
 import uuid
+import functools
+from itertools import chain, islice
 import base64
 
 # Configure logging
@@ -25,131 +35,381 @@ logging.basicConfig(
 # Constants
 MAX_RETRIES = 5
 RETRY_DELAY_BASE = 3  # seconds
+MAX_RETRY_DELAY = 60  # upper bound for a single wait, including server Retry-After hints
+RETRYABLE_STATUS_CODES = frozenset((429, 500, 502, 503, 504))
 HTTP_TIMEOUT = 300  # 5 minutes for HTTP requests
-
+MAX_WORKERS = 8  # concurrent Sheets API requests
+UPLOAD_WORKERS = 4  # concurrent GCS uploads and BigQuery load jobs
+DIRECT_LOAD_MAX_ROWS = 50000  # larger tables are staged through GCS before loading
+SPOOL_MAX_SIZE = 32 * 1024 * 1024  # staged files are kept in memory up to this size
+STAGING_TABLE_SUFFIX = "__stage_"  # incremental tables are loaded into <table>__stage_<id> per run, then merged
+STAGING_TABLE_EXPIRATION = timedelta(hours=1)  # staging tables left behind by a killed run expire on their own
+GZIP_LEVEL = 1  # fastest level; JSONL of sheet strings still compresses well
+NULL_VALUES = frozenset(("", "nichts gefunden", "#VALUE!"))  # blank and sheet error values loaded as NULL
+BOOLEAN_VALUES = {  # checkbox and yes/no values accepted for BOOLEAN columns
+    'true': True, 'wahr': True, 'yes': True, 'ja': True, '1': True,
+    'false': False, 'falsch': False, 'no': False, 'nein': False, '0': False
+}
+
+# Table prefixes per department (used when use_department_prefixes is enabled)
+TABLE_PREFIXES = {
+    "Paid Media": "performance",
+    "Paid Content": "content"
+}
+
+# Idle authorized HTTP objects. httplib2 is not thread-safe, so each request
+# borrows one exclusively; returning it keeps its keep-alive connection warm
+# for later requests, executors and warm invocations.
+_http_pool = queue.SimpleQueue()
+
+# API clients keyed by project ID. Cloud Functions reuse the process between
+# invocations, so warm starts skip credential lookup and client construction.
+_clients = {}
+
+# Datasets already confirmed to exist, keyed by (project, dataset ID). Entries are
+# dropped again when a load or merge reports the dataset as not found.
+_datasets = {}
+
+@functools.lru_cache(maxsize=None)
 def get_table_prefix(department):
     """Determines the table prefix based on department"""
-    prefix_mapping = {
-        "Paid Media": "performance",
-        "Paid Content": "content"
-    }
-    return prefix_mapping.get(department, "unknown")
+    return TABLE_PREFIXES.get(department, "unknown")
 
 def get_table_name(sheet_config, department, use_department_prefixes=True):
     """Constructs the table name with appropriate prefix"""
+    return _table_name(sheet_config['table_id'], department, use_department_prefixes)
+
+@functools.lru_cache(maxsize=None)
+def _table_name(table_id, department, use_department_prefixes):
+    """Table name for a (table_id, department) pair, memoized since configs repeat them every run"""
     if not use_department_prefixes:
-        return sheet_config['table_id']
+        return table_id
 
     prefix = get_table_prefix(department)
-    base_table_id = sheet_config['table_id'].replace('performance_', '').replace('content_', '')
+    base_table_id = table_id.removeprefix('performance_').removeprefix('content_')
     return f"{prefix}_{base_table_id}"
 
-def fetch_sheet_with_retry(sheets_service, master_sheet_id, sheet_name, range_value):
-    """Fetch data from Google Sheets with retry logic"""
+@contextmanager
+def pooled_http(credentials):
+    """Borrows an authorized HTTP object from the connection pool"""
+    try:
+        http = _http_pool.get_nowait()
+    except queue.Empty:
+        http = google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+    try:
+        yield http
+    finally:
+        _http_pool.put(http)
+
+def retry_delay(attempt, retry_after=None):
+    """Exponential backoff with full jitter, so concurrent fetches don't retry in lockstep
+
+    A Retry-After header (in seconds) from the server sets the minimum wait, capped
+    at MAX_RETRY_DELAY so a single hint can't use up the function timeout.
+    """
+    wait_time = random.uniform(0, RETRY_DELAY_BASE * (2 ** attempt))
+    if retry_after and retry_after.isdigit():
+        wait_time = max(wait_time, int(retry_after))
+    return min(wait_time, MAX_RETRY_DELAY)
+
+def fetch_sheets_with_retry(sheets_service, spreadsheet_id, sheet_configs, credentials=None, value_render_option='FORMATTED_VALUE'):
+    """Fetch all sheet ranges of a spreadsheet with a single batchGet call and retry logic
+
+    Returns one value range per sheet config; configs that read the same range
+    share a single fetched copy.
+    """
+    ranges = [f"{s['sheet_name']}!{s.get('range', 'A1:Z10000')}" for s in sheet_configs]
+    unique_ranges = list(dict.fromkeys(ranges))
     last_exception = None
 
     for attempt in range(MAX_RETRIES):
         try:
-            logging.info(f"Fetching {sheet_name}, attempt {attempt + 1}/{MAX_RETRIES}")
-
-            result = sheets_service.spreadsheets().values().get(
-                spreadsheetId=master_sheet_id,
-                range=f"{sheet_name}!{range_value}",
-                valueRenderOption='FORMATTED_VALUE'
-            ).execute(num_retries=3)
+            logging.info(f"Fetching {len(unique_ranges)} ranges, attempt {attempt + 1}/{MAX_RETRIES}")
+
+            request = sheets_service.spreadsheets().values().batchGet(
+                spreadsheetId=spreadsheet_id,
+                ranges=unique_ranges,
+                valueRenderOption=value_render_option
+            )
+            if credentials:
+                with pooled_http(credentials) as http:
+                    result = request.execute(http=http, num_retries=3)
+            else:
+                result = request.execute(num_retries=3)
 
-            return result
+            value_ranges = dict(zip(unique_ranges, result.get('valueRanges', [])))
+            return [value_ranges.get(r, {}) for r in ranges]
         except HttpError as e:
             last_exception = e
-            if e.resp.status in [429, 500, 502, 503, 504]:
-                wait_time = RETRY_DELAY_BASE * (2 ** attempt)
-                logging.warning(f"HTTP error {e.resp.status} reading {sheet_name}. Retrying in {wait_time}s.")
-                time.sleep(wait_time)
+            if e.resp.status in RETRYABLE_STATUS_CODES:
+                if attempt < MAX_RETRIES - 1:
+                    wait_time = retry_delay(attempt, e.resp.get('retry-after'))
+                    logging.warning(f"HTTP error {e.resp.status} reading {spreadsheet_id}. Retrying in {wait_time:.1f}s.")
+                    time.sleep(wait_time)
+                else:
+                    logging.error(f"HTTP error {e.resp.status} reading {spreadsheet_id} after {MAX_RETRIES} attempts")
             else:
-                logging.error(f"Non-retryable HTTP error reading {sheet_name}: {str(e)}")
+                logging.error(f"Non-retryable HTTP error reading {spreadsheet_id}: {str(e)}")
                 raise
-        except Exception as e:
+        except (OSError, HTTPException, httplib2.HttpLib2Error, TransportError) as e:
+            # Connection resets, dropped or truncated responses, timeouts and TLS
+            # errors are transient; anything else is a bug or a bad config and
+            # fails without waiting
             last_exception = e
-            wait_time = RETRY_DELAY_BASE * (2 ** attempt)
             if attempt < MAX_RETRIES - 1:
-                logging.warning(f"Error reading {sheet_name}. Retrying in {wait_time}s. Error: {str(e)}")
+                wait_time = retry_delay(attempt)
+                logging.warning(f"Error reading {spreadsheet_id}. Retrying in {wait_time:.1f}s. Error: {str(e)}")
                 time.sleep(wait_time)
             else:
-                logging.error(f"Error reading {sheet_name} after {MAX_RETRIES} attempts: {str(e)}")
+                logging.error(f"Error reading {spreadsheet_id} after {MAX_RETRIES} attempts: {str(e)}")
 
     if last_exception:
         raise last_exception
 
-def process_sheet(sheets_service, master_sheet_id, sheet_config, department):
-    """Process a single sheet from the master Google Sheet"""
-    try:
-        sheet_name = sheet_config['sheet_name']
-        range_value = sheet_config.get('range', 'A1:Z10000')
+def fetch_department_sheets(sheets_service, spreadsheet_id, sheet_configs, credentials=None):
+    """Fetch a department's sheet ranges with one batchGet, falling back to one range at a time
 
-        result = fetch_sheet_with_retry(sheets_service, master_sheet_id, sheet_name, range_value)
+    A missing tab or bad range fails the whole batchGet with HTTP 400; reading the
+    ranges one by one keeps the other tables of the spreadsheet loading. Ranges
+    that still fail are returned as None. Ranges with typed columns are read a
+    second time with UNFORMATTED_VALUE, added as 'unformatted_values'.
+    """
+    try:
+        value_ranges = fetch_sheets_with_retry(sheets_service, spreadsheet_id, sheet_configs, credentials)
+    except HttpError as e:
+        if e.resp.status != 400 or len(sheet_configs) < 2:
+            raise
+        logging.warning(f"Batch read of {spreadsheet_id} failed, reading {len(sheet_configs)} ranges one at a time: {str(e)}")
+
+        value_ranges = []
+        for sheet_config in sheet_configs:
+            try:
+                value_ranges.extend(fetch_sheets_with_retry(sheets_service, spreadsheet_id, [sheet_config], credentials))
+            except HttpError as e:
+                logging.error(f"Error reading {sheet_config['sheet_name']} from {spreadsheet_id}: {str(e)}")
+                value_ranges.append(None)
+
+    # Formatted values depend on the sheet locale ("1.234" is 1234 in German sheets),
+    # so typed columns are taken from the raw numbers and booleans instead
+    typed = [
+        i for i, sheet_config in enumerate(sheet_configs)
+        if value_ranges[i] is not None and has_typed_columns(sheet_config)
+    ]
+    for attempt in range(2):
+        if not typed:
+            break
+        unformatted = fetch_sheets_with_retry(
+            sheets_service, spreadsheet_id, [sheet_configs[i] for i in typed], credentials, 'UNFORMATTED_VALUE'
+        )
 
-        values = result.get('values', [])
-        if not values or len(values) <= 1:
-            logging.warning(f"No data rows found for {sheet_name}")
+        # Both reads are matched by row index, so a sheet edited in between (rows
+        # inserted or removed) would attach typed values to the wrong rows
+        changed = []
+        for i, value_range in zip(typed, unformatted):
+            values = value_range.get('values') or []
+            if [len(row) for row in values] != [len(row) for row in value_ranges[i].get('values') or []]:
+                changed.append(i)
+                continue
+            value_ranges[i] = {**value_ranges[i], 'unformatted_values': values}
+        typed = changed
+
+        if typed and attempt == 0:
+            logging.warning(f"{len(typed)} ranges of {spreadsheet_id} changed between reads, reading them again")
+            refreshed = fetch_sheets_with_retry(sheets_service, spreadsheet_id, [sheet_configs[i] for i in typed], credentials)
+            for i, value_range in zip(typed, refreshed):
+                value_ranges[i] = value_range
+
+    for i in typed:
+        logging.error(f"{sheet_configs[i]['sheet_name']} in {spreadsheet_id} kept changing while it was read, skipping it")
+        value_ranges[i] = None
+    return value_ranges
+
+def to_integer(value):
+    """Convert an unformatted sheet value to int; None unless it is a whole number
+
+    Cells formatted as plain text arrive as strings even when unformatted, so
+    numeric strings such as "12" are parsed too.
+    """
+    if isinstance(value, str):
+        try:
+            return int(value.strip())
+        except ValueError:
             return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not float(value).is_integer():
+        return None
+    return int(value)
 
-        # Get headers and create DataFrame
-        headers = values[0]
-        df = pd.DataFrame(values[1:], columns=headers)
-
-        # Add metadata columns
-        df['department'] = department
-        df['import_timestamp'] = datetime.now().isoformat()
-
-        # Rename columns according to mapping
-        column_mappings = sheet_config.get('columns', {})
-        valid_mappings = {k: v for k, v in column_mappings.items() if k in df.columns}
-        df = df.rename(columns=valid_mappings)
-
-        # Replace error values with None
-        for col in df.columns:
-            df[col] = df[col].replace(["nichts gefunden", "#VALUE!"], None)
+def to_float(value):
+    """Convert an unformatted sheet value to float; None unless it is a number
 
+    Numeric strings from cells formatted as plain text are parsed too.
+    """
+    if isinstance(value, str):
+        try:
+            return float(value.strip())
+        except ValueError:
+            return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return float(value)
+
+def to_boolean(value):
+    """Convert an unformatted checkbox, 1/0 or yes/no text value to bool; None for anything else"""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str):
+        return BOOLEAN_VALUES.get(value.strip().lower())
+    return None
+
+# Converters from unformatted cell values for the BigQuery types a column mapping
+# can declare; STRING columns keep the formatted value and need none
+COLUMN_CONVERTERS = {
+    'INTEGER': to_integer,
+    'INT64': to_integer,
+    'FLOAT': to_float,
+    'FLOAT64': to_float,
+    'BOOLEAN': to_boolean,
+    'BOOL': to_boolean
+}
+
+def column_spec(header, column_mappings):
+    """Resolve a sheet header to its (BigQuery column name, type) from the column mapping
+
+    A mapping value is either the column name or {"name": ..., "type": ...}.
+    """
+    mapping = column_mappings.get(header, header)
+    if not isinstance(mapping, dict):
+        return mapping, "STRING"
+    col_type = mapping.get('type', 'STRING').upper()
+    if col_type != 'STRING' and col_type not in COLUMN_CONVERTERS:
+        logging.warning(f"Unsupported type {col_type} for column {header}, loading it as STRING")
+        col_type = 'STRING'
+    return mapping.get('name', header), col_type
+
+def has_typed_columns(sheet_config):
+    """Whether any column mapping of a sheet config declares a non-STRING type"""
+    return any(
+        isinstance(mapping, dict) and mapping.get('type', 'STRING').upper() != 'STRING'
+        for mapping in sheet_config.get('columns', {}).values()
+    )
+
+def iter_records(values, headers, metadata, typed_columns=(), unformatted_values=(), sheet_name=None):
+    """Yield one normalized record per non-empty data row of a sheet range, with metadata fields added
+
+    typed_columns holds (column index, column, converter) triples; their values are
+    converted from the matching cells of unformatted_values. Values that cannot be
+    converted become None and are counted in a warning once the range is done.
+    """
+    failed = 0
+    first_failure = None
+    for index, row in enumerate(islice(values, 1, None), 1):
+        # The API returns blank rows as empty lists; skip them before any per-cell work
+        if not row:
+            continue
+
+        # Blanks, whitespace-only cells and error values become None; FORMATTED_VALUE
+        # cells are already strings, so they are passed through as-is
+        record = {
+            h: None if c is None or c in NULL_VALUES or c.isspace() else c
+            for h, c in zip(headers, row)
+        }
         # Filter out empty rows
-        initial_row_count = len(df)
-        df = df.replace(r'^\s*$', None, regex=True)
-        df = df.dropna(how='all')
+        if any(v is not None for v in record.values()):
+            if typed_columns:
+                raw_row = unformatted_values[index] if index < len(unformatted_values) else []
+                for i, h, convert in typed_columns:
+                    if record.get(h) is None:
+                        continue
+                    value = convert(raw_row[i]) if i < len(raw_row) else None
+                    if value is None:
+                        failed += 1
+                        first_failure = first_failure or (h, record[h])
+                    record[h] = value
+            record.update(metadata)
+            yield record
+
+    if failed:
+        logging.warning(
+            f"Loaded {failed} values in {sheet_name} as NULL because they do not match their column type "
+            f"(first: {first_failure[0]} = {first_failure[1]!r})"
+        )
 
-        filtered_count = initial_row_count - len(df)
-        if filtered_count > 0:
-            logging.info(f"Filtered out {filtered_count} empty rows for {sheet_name}")
+def process_sheet(value_range, sheet_config, metadata):
+    """Process a single sheet range into (columns, records, row_count) for BigQuery
+
+    columns maps each BigQuery column name to its type. Records are produced
+    lazily so they can be streamed into the upload without holding the whole
+    table as a list; row_count includes rows that turn out empty.
+    """
+    sheet_name = sheet_config['sheet_name']
+    try:
+        values = value_range.get('values') or []
+        if len(values) <= 1:
+            logging.warning(f"No data rows found for {sheet_name}")
+            return None
 
-        logging.info(f"Successfully read {len(df)} rows for {sheet_name}")
-        return df
+        # Rename headers according to mapping and add metadata columns
+        column_mappings = sheet_config.get('columns', {})
+        specs = [column_spec(h, column_mappings) for h in values[0]]
+        headers = [col for col, _ in specs]
+        columns = dict(specs)
+        typed_columns = [
+            (i, col, COLUMN_CONVERTERS[col_type]) for i, (col, col_type) in enumerate(specs) if col_type != 'STRING'
+        ]
+        columns.update(dict.fromkeys(metadata, "STRING"))
+
+        logging.info(f"Successfully read {len(values) - 1} rows for {sheet_name}")
+        records = iter_records(
+            values, headers, metadata, typed_columns, value_range.get('unformatted_values', ()), sheet_name
+        )
+        return columns, records, len(values) - 1
     except Exception as e:
         logging.error(f"Error processing {sheet_name}: {str(e)}")
         return None
 
-def upload_to_bigquery(df, table_id, project_id, dataset_id, storage_client, bigquery_client, staging_bucket, group_name=None):
-    """Upload dataframe to BigQuery with staging through GCS"""
-    try:
-        # Convert all data to strings
-        df = df.astype(str)
-        df = df.replace(r'^\s*$', None, regex=True)
-        df = df.replace(["None", "nan"], None)
-
-        # Prepare for upload
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        unique_id = str(uuid.uuid4())[:8]
-        path_prefix = f"staging/{group_name}/{table_id}" if group_name else f"staging/{table_id}"
-        gcs_filename = f"{path_prefix}/{timestamp}_{unique_id}.jsonl"
-
-        # Upload to GCS
-        logging.info(f"Uploading to GCS: {gcs_filename}")
-        bucket = storage_client.bucket(staging_bucket)
-        blob = bucket.blob(gcs_filename)
-        json_data = df.to_json(orient='records', lines=True, force_ascii=False)
-        blob.upload_from_string(json_data)
-
-        gcs_uri = f"gs://{staging_bucket}/{gcs_filename}"
-        logging.info(f"Uploaded to {gcs_uri}")
-
-        # Get or create dataset
+def write_jsonl(records, fileobj):
+    """Write records as gzip-compressed JSONL into a binary file object and return the row count"""
+    row_count = 0
+    with gzip.GzipFile(fileobj=fileobj, mode='wb', compresslevel=GZIP_LEVEL) as gz:
+        for record in records:
+            gz.write(orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE))
+            row_count += 1
+    return row_count
+
+def stage_to_gcs(records, table_id, storage_client, staging_bucket, group_name=None):
+    """Write records as compressed JSONL and upload them to the GCS staging bucket, returning (uri, row_count)"""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    unique_id = str(uuid.uuid4())[:8]
+    path_prefix = f"staging/{group_name}/{table_id}" if group_name else f"staging/{table_id}"
+    gcs_filename = f"{path_prefix}/{timestamp}_{unique_id}.jsonl.gz"
+
+    logging.info(f"Uploading to GCS: {gcs_filename}")
+    bucket = storage_client.bucket(staging_bucket)
+    blob = bucket.blob(gcs_filename)
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as spool:
+        row_count = write_jsonl(records, spool)
+        size = spool.tell()
+
+        # With the size known up front, google-cloud-storage sends files up to 8 MiB
+        # in a single multipart request and larger ones through a resumable session
+        # with its default 100 MiB chunks
+        blob.upload_from_file(spool, size=size, rewind=True, content_type='application/gzip', if_generation_match=0)
+
+    gcs_uri = f"gs://{staging_bucket}/{gcs_filename}"
+    logging.info(f"Uploaded to {gcs_uri}")
+    return gcs_uri, row_count
+
+@functools.lru_cache(maxsize=128)
+def make_schema(columns):
+    """Builds the BigQuery schema for a tuple of (column name, type) pairs"""
+    return tuple(bigquery.SchemaField(col, col_type) for col, col_type in columns)
+
+def ensure_dataset(bigquery_client, dataset_id):
+    """Get or create the BigQuery dataset in europe-west3, once per process"""
+    key = (bigquery_client.project, dataset_id)
+    if key not in _datasets:
         dataset_ref = bigquery_client.dataset(dataset_id)
         try:
             dataset = bigquery_client.get_dataset(dataset_ref)
@@ -157,30 +417,255 @@ def upload_to_bigquery(df, table_id, project_id, dataset_id, storage_client, big
             logging.info(f"Creating dataset {dataset_id} in europe-west3")
             dataset = bigquery.Dataset(dataset_ref)
             dataset.location = "europe-west3"
-            dataset = bigquery_client.create_dataset(dataset)
+            # Groups run concurrently and may share a dataset; whichever thread
+            # loses the race gets the existing dataset back instead of a 409
+            dataset = bigquery_client.create_dataset(dataset, exists_ok=True)
+        _datasets[key] = dataset
+    return _datasets[key]
+
+def forget_dataset(project, dataset_id):
+    """Drop a cached dataset so the next ensure_dataset looks it up (or recreates it) again"""
+    if _datasets.pop((project, dataset_id), None) is not None:
+        logging.warning(f"Dataset {project}.{dataset_id} not found, it will be looked up again on the next run")
+
+def drop_duplicate_keys(records, merge_keys, table_id):
+    """Yield only the first record per merge key, logging how many duplicates were dropped
+
+    MERGE fails when several source rows match the same target row.
+    """
+    seen = set()
+    duplicates = 0
+    first_duplicate = None
+    for record in records:
+        key = tuple(record.get(k) for k in merge_keys)
+        if key in seen:
+            duplicates += 1
+            first_duplicate = first_duplicate or key
+            continue
+        seen.add(key)
+        yield record
+    if duplicates:
+        logging.warning(
+            f"Dropped {duplicates} rows with duplicate {', '.join(merge_keys)} in {table_id} "
+            f"(first duplicate: {first_duplicate})"
+        )
 
+def merge_into_table(bigquery_client, dataset, table_id, staging_table_id, columns, merge_keys):
+    """Start a MERGE of the staging table into the target table on merge_keys
+
+    Rows are updated or inserted by key; rows that disappeared from the sheet are kept.
+    Keys are compared null-safely, so rows with a blank key cell update the existing
+    row instead of being inserted again on every run.
+    """
+    target = f"{dataset.project}.{dataset.dataset_id}.{table_id}"
+    staging = f"{dataset.project}.{dataset.dataset_id}.{staging_table_id}"
+
+    # The first run creates the target so MERGE has a table to write into
+    bigquery_client.create_table(bigquery.Table(target, schema=make_schema(tuple(columns.items()))), exists_ok=True)
+
+    on = " AND ".join(f"T.`{key}` IS NOT DISTINCT FROM S.`{key}`" for key in merge_keys)
+    updates = ", ".join(f"`{col}` = S.`{col}`" for col in columns if col not in merge_keys)
+    names = ", ".join(f"`{col}`" for col in columns)
+    values = ", ".join(f"S.`{col}`" for col in columns)
+    query = (
+        f"MERGE `{target}` T USING `{staging}` S ON {on} "
+        f"WHEN MATCHED THEN UPDATE SET {updates} "
+        f"WHEN NOT MATCHED THEN INSERT ({names}) VALUES ({values})"
+    )
+    return bigquery_client.query(query, location=dataset.location)
+
+def upload_to_bigquery(columns, records, row_count, table_id, dataset, storage_client, bigquery_client, staging_bucket, group_name=None, merge_keys=None):
+    """Upload records and start a BigQuery load job, staging through GCS for large tables
+
+    With merge_keys the records are loaded into a staging table of this run, merged
+    into the target table and the staging table is dropped again. Returns the
+    running load job, the finished merge job, or a result message when nothing
+    was loaded.
+    """
+    try:
         # Configure load job
         job_config = bigquery.LoadJobConfig(
             write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
             source_format=bigquery.SourceFormat.NEWLINE_DELIMITED_JSON,
             autodetect=False,
-            schema=[bigquery.SchemaField(col, "STRING") for col in df.columns]
+            schema=make_schema(tuple(columns.items()))
         )
 
-        # Load to BigQuery
-        table_ref = dataset.table(table_id)
-        load_job = bigquery_client.load_table_from_uri(gcs_uri, table_ref, job_config=job_config)
-        load_job.result(timeout=600)  # 10 minute timeout
+        # Overlapping runs each get their own staging table, so they can't load or
+        # merge each other's rows
+        if merge_keys:
+            load_table_id = f"{table_id}{STAGING_TABLE_SUFFIX}{uuid.uuid4().hex[:8]}"
+            records = drop_duplicate_keys(records, merge_keys, table_id)
+        else:
+            load_table_id = table_id
+        table_ref = dataset.table(load_table_id)
+
+        # Serialize records; small tables are sent with the load job itself
+        if row_count <= DIRECT_LOAD_MAX_ROWS:
+            payload = io.BytesIO()
+            written = write_jsonl(records, payload)
+            source = None
+        else:
+            source, written = stage_to_gcs(records, table_id, storage_client, staging_bucket, group_name)
 
-        table = bigquery_client.get_table(table_ref)
-        return f"Loaded {table.num_rows} rows into {project_id}.{dataset_id}.{table_id}"
+        if row_count > written:
+            logging.info(f"Filtered out {row_count - written} empty{' or duplicate' if merge_keys else ''} rows for {table_id}")
+        if not written:
+            msg = f"No data for {table_id}"
+            logging.warning(msg)
+            return msg
+
+        if merge_keys:
+            staging_table = bigquery.Table(table_ref, schema=job_config.schema)
+            staging_table.expires = datetime.now(timezone.utc) + STAGING_TABLE_EXPIRATION
+            bigquery_client.create_table(staging_table)
+            job_config.write_disposition = bigquery.WriteDisposition.WRITE_APPEND
+
+        try:
+            # Load to BigQuery
+            if source is None:
+                logging.info(f"Loading {written} rows into {load_table_id} without GCS staging")
+                load_job = bigquery_client.load_table_from_file(payload, table_ref, job_config=job_config, rewind=True)
+            else:
+                load_job = bigquery_client.load_table_from_uri(source, table_ref, job_config=job_config)
+
+            logging.info(f"Started load job {load_job.job_id} for {load_table_id}")
+            if not merge_keys:
+                return load_job
+
+            load_job.result(timeout=600)  # 10 minute timeout
+            merge_job = merge_into_table(bigquery_client, dataset, table_id, load_table_id, columns, merge_keys)
+            logging.info(f"Started merge job {merge_job.job_id} for {table_id} on {', '.join(merge_keys)}")
+            merge_job.result(timeout=600)  # the staging table is only dropped once the merge is done
+            return merge_job
+        finally:
+            if merge_keys:
+                try:
+                    bigquery_client.delete_table(table_ref, not_found_ok=True)
+                except Exception as e:
+                    logging.warning(f"Could not drop staging table {load_table_id}: {str(e)}")
 
     except Exception as e:
+        if isinstance(e, NotFound):
+            forget_dataset(dataset.project, dataset.dataset_id)
         logging.error(f"Error uploading to BigQuery: {str(e)}")
         return f"Error uploading to BigQuery: {str(e)}"
 
-def process_data_group(group_name, group_config, project_id, staging_bucket, sheets_service, bigquery_client, storage_client):
-    """Process a single data group (Kapa version)"""
+def wait_for_load_jobs(load_jobs):
+    """Wait for submitted (table, load or merge job) pairs and return one result message per job"""
+    results = []
+    for table, load_job in load_jobs:
+        try:
+            load_job.result(timeout=600)  # 10 minute timeout
+            if load_job.job_type == 'query':
+                results.append(f"Merged {load_job.num_dml_affected_rows} rows into {table}")
+            else:
+                results.append(f"Loaded {load_job.output_rows} rows into {table}")
+        except Exception as e:
+            if isinstance(e, NotFound):
+                project, dataset_id, _ = table.split('.')
+                forget_dataset(project, dataset_id)
+            error_msg = f"Error loading {table} into BigQuery: {str(e)}"
+            logging.error(error_msg)
+            results.append(error_msg)
+    return results
+
+def process_and_upload_table(table_id, sheets, dataset, storage_client, bigquery_client, staging_bucket, group_name):
+    """Process all sheet ranges of one BigQuery table and start a single load job for them
+
+    sheets is a list of (value_range, sheet_config, metadata) tuples.
+    """
+    columns = {}
+    record_streams = []
+    row_count = 0
+    merge_keys = None
+    for value_range, sheet_config, metadata in sheets:
+        if merge_keys is None:
+            merge_keys = sheet_config.get('merge_keys')
+        processed = process_sheet(value_range, sheet_config, metadata)
+        if processed is None:
+            logging.warning(f"No data for {sheet_config['sheet_name']}")
+            continue
+        sheet_columns, records, sheet_row_count = processed
+        columns.update(sheet_columns)
+        record_streams.append(records)
+        row_count += sheet_row_count
+
+    if not record_streams:
+        msg = f"No data for {table_id}"
+        logging.warning(msg)
+        return msg
+
+    # A misspelled key or a plain string would make every key NULL (or a character)
+    # and drop all but the first row as duplicates, so fail the table up front
+    if merge_keys is not None:
+        if not isinstance(merge_keys, list) or not merge_keys or not all(isinstance(k, str) for k in merge_keys):
+            msg = f"Invalid merge_keys for {table_id}: expected a non-empty list of column names, got {merge_keys!r}"
+            logging.error(msg)
+            return msg
+        missing = [k for k in merge_keys if k not in columns]
+        if missing:
+            msg = f"Invalid merge_keys for {table_id}: {', '.join(missing)} not found in columns {', '.join(columns)}"
+            logging.error(msg)
+            return msg
+
+    logging.info(f"Using table ID: {table_id} ({len(record_streams)} sheet ranges)")
+
+    # Upload to BigQuery; the sheet values are released once this task returns
+    return upload_to_bigquery(
+        columns, chain.from_iterable(record_streams), row_count, table_id, dataset,
+        storage_client, bigquery_client, staging_bucket, group_name, merge_keys
+    )
+
+def department_configs_from_team_sheets(team_sheets, aggregated_views, group_name):
+    """Builds department_configs for groups where every team has its own spreadsheet
+
+    Each team reads the views of its department from its own sheet, so it becomes
+    its own entry with a spreadsheet_id and a googlesheet_name metadata column.
+    Returns (department_configs, messages) where messages report views and
+    departments that cannot be loaded.
+    """
+    messages = []
+    departments = {team_sheet['department'] for team_sheet in team_sheets}
+    teams_by_department = {}
+    for team_sheet in team_sheets:
+        if not (team_sheet.get('sheet_id') or '').strip():
+            logging.info(f"Skipping team {team_sheet['team']} - no sheet_id configured")
+            continue
+        teams_by_department.setdefault(team_sheet['department'], []).append(team_sheet)
+
+    valid_views = []
+    for view in aggregated_views:
+        view_name = view.get('name', 'Unknown view')
+        if not view.get('sheet_name'):
+            logging.error(f"No sheet name specified for view {view_name}")
+            messages.append(f"No sheet name for {view_name}")
+            continue
+        if 'department' in view and view['department'] not in departments:
+            logging.warning(f"No teams found for department: {view['department']}")
+            messages.append(f"No teams found for {view['department']} in {group_name}")
+            continue
+        valid_views.append(view)
+
+    department_configs = []
+    for department, teams in teams_by_department.items():
+        # Views without a department apply to every department of the group
+        views = [view for view in valid_views if view.get('department', department) == department]
+        for team_sheet in teams:
+            department_configs.append({
+                'department': department,
+                'spreadsheet_id': team_sheet['sheet_id'],
+                'metadata': {'googlesheet_name': f"Strang {team_sheet['team']}"},
+                'sheets': views
+            })
+    return department_configs, messages
+
+def process_data_group(group_name, group_config, project_id, staging_bucket, sheets_service, bigquery_client, storage_client, fetch_executor, upload_executor, import_timestamp, credentials=None):
+    """Process a single data group on the shared fetch and upload pools
+
+    Groups either list department_configs read from one master spreadsheet, or
+    team_sheets and aggregated_views read from one spreadsheet per team.
+    """
     results = []
 
     try:
@@ -194,50 +679,105 @@ def process_data_group(group_name, group_config, project_id, staging_bucket, she
         master_sheet_id = group_config.get('master_sheet_id')
         use_department_prefixes = group_config.get('use_department_prefixes', True)
         dataset_id = group_config.get('dataset_id')
-        department_configs = group_config.get('department_configs', [])
 
-        if not master_sheet_id:
+        if 'team_sheets' in group_config:
+            department_configs, config_messages = department_configs_from_team_sheets(
+                group_config['team_sheets'], group_config.get('aggregated_views', []), group_name
+            )
+            results.extend(config_messages)
+        elif master_sheet_id:
+            department_configs = group_config.get('department_configs', [])
+        else:
             return [f"No master_sheet_id specified for group {group_name}"]
 
         if not dataset_id:
             return [f"No dataset_id specified for group {group_name}"]
 
-        # Process each department configuration
+        # Resolve the dataset once for all tables of this group
+        dataset = ensure_dataset(bigquery_client, dataset_id)
+
+        # Resolve every sheet's destination table up front. Sheets that share a table
+        # are combined into one load job, so a table is only submitted once all of
+        # its sheets have been fetched.
+        remaining_sheets = {}
         for dept_config in department_configs:
             department = dept_config.get('department', 'Unknown')
+            for sheet_config in dept_config.get('sheets', []):
+                table_id = get_table_name(sheet_config, department, use_department_prefixes)
+                remaining_sheets[table_id] = remaining_sheets.get(table_id, 0) + 1
+
+        # Fetch all departments concurrently and hand each table to the upload pool
+        # as soon as its sheets arrive, so uploads and load jobs overlap
+        fetch_futures = {}
+        for dept_config in department_configs:
             sheets = dept_config.get('sheets', [])
+            spreadsheet_id = dept_config.get('spreadsheet_id', master_sheet_id)
+            logging.info(f"Processing {len(sheets)} sheets for department: {dept_config.get('department', 'Unknown')} ({spreadsheet_id})")
+            if sheets:
+                future = fetch_executor.submit(fetch_department_sheets, sheets_service, spreadsheet_id, sheets, credentials)
+                fetch_futures[future] = dept_config
+
+        table_sheets = {}
+        failed_tables = {}  # table_id -> department whose sheets failed to load
+        upload_futures = {}
+        for future in as_completed(fetch_futures):
+            dept_config = fetch_futures[future]
+            department = dept_config.get('department', 'Unknown')
 
-            logging.info(f"Processing {len(sheets)} sheets for department: {department}")
+            try:
+                value_ranges = future.result()
+            except Exception as e:
+                error_msg = f"Error reading sheets for {department} ({dept_config.get('spreadsheet_id', master_sheet_id)}): {str(e)}"
+                logging.error(error_msg)
+                results.append(error_msg)
+                value_ranges = [None] * len(dept_config['sheets'])
+
+            metadata = {
+                **dept_config.get('metadata', {}),
+                'department': department,
+                'import_timestamp': import_timestamp
+            }
+            for sheet_config, value_range in zip(dept_config['sheets'], value_ranges):
+                table_id = get_table_name(sheet_config, department, use_department_prefixes)
+                remaining_sheets[table_id] -= 1
+                if value_range is None:
+                    failed_tables.setdefault(table_id, department)
+                else:
+                    table_sheets.setdefault(table_id, []).append((value_range, sheet_config, metadata))
+                if remaining_sheets[table_id]:
+                    continue
 
-            for sheet_config in sheets:
-                try:
-                    # Read the sheet from master
-                    df = process_sheet(sheets_service, master_sheet_id, sheet_config, department)
-
-                    if df is not None and not df.empty:
-                        # Get table name with correct prefix
-                        table_id = get_table_name(sheet_config, department, use_department_prefixes)
-                        logging.info(f"Using table ID: {table_id}")
-
-                        # Upload to BigQuery
-                        upload_result = upload_to_bigquery(
-                            df, table_id, project_id, dataset_id,
-                            storage_client, bigquery_client, staging_bucket, group_name
-                        )
-                        results.append(upload_result)
-
-                        # Clean up memory
-                        del df
-                        gc.collect()
-                    else:
-                        msg = f"No data for {sheet_config['sheet_name']}"
-                        logging.warning(msg)
-                        results.append(msg)
+                # Don't truncate shared tables with only part of their sheets
+                if table_id in failed_tables:
+                    table_sheets.pop(table_id, None)
+                    msg = f"Skipped {table_id}: sheets for {failed_tables[table_id]} failed to load"
+                    logging.warning(msg)
+                    results.append(msg)
+                    continue
 
-                except Exception as e:
-                    error_msg = f"Error processing {sheet_config.get('sheet_name', 'unknown')}: {str(e)}"
-                    logging.error(error_msg)
-                    results.append(error_msg)
+                upload_future = upload_executor.submit(
+                    process_and_upload_table, table_id, table_sheets.pop(table_id), dataset,
+                    storage_client, bigquery_client, staging_bucket, group_name
+                )
+                upload_futures[upload_future] = table_id
+
+        load_jobs = []
+        for future in as_completed(upload_futures):
+            try:
+                upload_result = future.result()
+            except Exception as e:
+                error_msg = f"Error processing {upload_futures[future]}: {str(e)}"
+                logging.error(error_msg)
+                results.append(error_msg)
+                continue
+
+            if isinstance(upload_result, str):
+                results.append(upload_result)
+            else:
+                load_jobs.append((f"{dataset.project}.{dataset.dataset_id}.{upload_futures[future]}", upload_result))
+
+        # Load jobs run server-side; wait for all of them once everything is submitted
+        results.extend(wait_for_load_jobs(load_jobs))
 
         return results
 
@@ -246,6 +786,37 @@ def process_data_group(group_name, group_config, project_id, staging_bucket, she
         logging.error(error_msg)
         return [error_msg]
 
+def get_clients(project_id):
+    """Returns credentials and API clients, created once per process and project"""
+    if project_id not in _clients:
+        # Tokens are fetched lazily on the first request and refreshed when expired
+        credentials, _ = default()
+
+        scoped_credentials = credentials.with_scopes([
+            'https://www.googleapis.com/auth/spreadsheets.readonly',
+            'https://www.googleapis.com/auth/cloud-platform'
+        ])
+
+        # Configure HTTP with timeout
+        http = httplib2.Http(timeout=HTTP_TIMEOUT)
+        http = google_auth_httplib2.AuthorizedHttp(scoped_credentials, http=http)
+
+        # Initialize services; the Sheets discovery document ships with the client library
+        sheets_service = build('sheets', 'v4', http=http, cache_discovery=False, static_discovery=True)
+        bigquery_client = bigquery.Client(project=project_id, credentials=scoped_credentials)
+        storage_client = storage.Client(project=project_id, credentials=scoped_credentials)
+
+        _clients[project_id] = (scoped_credentials, sheets_service, bigquery_client, storage_client)
+        logging.info(f"Initialized services with {HTTP_TIMEOUT}s HTTP timeout")
+
+    return _clients[project_id]
+
+@functools.lru_cache(maxsize=None)
+def load_config(path='config.json'):
+    """Reads the import config once per process; warm invocations reuse it"""
+    with open(path, 'rb') as config_file:
+        return orjson.loads(config_file.read())
+
 def import_team_capacity():
     """Core function to import data from all enabled groups"""
     all_results = []
@@ -259,8 +830,7 @@ def import_team_capacity():
 
         # Read config
         try:
-            with open('config.json', 'r') as config_file:
-                config = json.loads(config_file.read())
+            config = load_config()
         except Exception as e:
             logging.error(f"Error reading config file: {str(e)}")
             return ["Failed to read config file"]
@@ -271,55 +841,61 @@ def import_team_capacity():
         if not project_id or not staging_bucket:
             return ["Missing project_id or staging_bucket in config"]
 
-        # Initialize credentials with timeout
+        # Initialize credentials and services (reused across warm invocations)
         try:
-            credentials, _ = default()
-            credentials.refresh(Request())
-
-            scoped_credentials = credentials.with_scopes([
-                'https://www.googleapis.com/auth/spreadsheets.readonly',
-                'https://www.googleapis.com/auth/cloud-platform'
-            ])
-
-            # Configure HTTP with timeout
-            http = httplib2.Http(timeout=HTTP_TIMEOUT)
-            http = google_auth_httplib2.AuthorizedHttp(scoped_credentials, http=http)
-
-            # Initialize services
-            sheets_service = build('sheets', 'v4', http=http)
-            bigquery_client = bigquery.Client(project=project_id, credentials=scoped_credentials)
-            storage_client = storage.Client(project=project_id, credentials=scoped_credentials)
-
-            logging.info(f"Initialized services with {HTTP_TIMEOUT}s HTTP timeout")
+            scoped_credentials, sheets_service, bigquery_client, storage_client = get_clients(project_id)
         except Exception as e:
             logging.error(f"Error initializing credentials: {str(e)}")
             return ["Failed to initialize credentials"]
 
-        # Process each group
-        groups_processed = 0
+        # Collect the groups to process
+        groups = []
         for key, value in config.items():
             if key in ['project_id', 'staging_bucket'] or not isinstance(value, dict):
                 continue
 
-            # Check if this is a data group with new structure
-            if 'master_sheet_id' in value and 'department_configs' in value:
+            # Check if this is a data group (master sheet or per-team sheets)
+            if ('master_sheet_id' in value and 'department_configs' in value) or \
+                    ('team_sheets' in value and 'aggregated_views' in value):
                 if target_group and key != target_group:
                     logging.info(f"Skipping group {key} (not matching target)")
                     continue
-
-                logging.info(f"Processing data group: {key}")
-                groups_processed += 1
-
-                group_results = process_data_group(
-                    group_name=key,
-                    group_config=value,
-                    project_id=project_id,
-                    staging_bucket=staging_bucket,
-                    sheets_service=sheets_service,
-                    bigquery_client=bigquery_client,
-                    storage_client=storage_client
-                )
-                all_results.extend(group_results)
+                groups.append((key, value))
+        groups_processed = len(groups)
+
+        # Process groups concurrently; all groups share one fetch pool and one
+        # upload pool, and every row of this run gets the same import timestamp
+        import_timestamp = datetime.now().isoformat()
+        if groups:
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as fetch_executor, \
+                    ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as upload_executor, \
+                    ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(groups))) as group_executor:
+                futures = []
+                for key, value in groups:
+                    logging.info(f"Processing data group: {key}")
+                    futures.append((key, group_executor.submit(
+                        process_data_group,
+                        group_name=key,
+                        group_config=value,
+                        project_id=project_id,
+                        staging_bucket=staging_bucket,
+                        sheets_service=sheets_service,
+                        bigquery_client=bigquery_client,
+                        storage_client=storage_client,
+                        fetch_executor=fetch_executor,
+                        upload_executor=upload_executor,
+                        import_timestamp=import_timestamp,
+                        credentials=scoped_credentials
+                    )))
+
+                # Keep results in config order
+                for key, future in futures:
+                    try:
+                        all_results.extend(future.result())
+                    except Exception as e:
+                        error_msg = f"Error processing group {key}: {str(e)}"
+                        logging.error(error_msg)
+                        all_results.append(error_msg)
 
         if groups_processed == 0:
             warning_msg = f"No groups processed. Target group: {target_group if target_group else 'all'}"
@@ -340,9 +916,10 @@ def main(event, context):
     logging.info(f"Starting import job at {start_time}")
 
     try:
-        if 'data' in event:
+        # The message body is only logged, so skip decoding it unless debugging
+        if 'data' in event and logging.getLogger().isEnabledFor(logging.DEBUG):
             pubsub_message = base64.b64decode(event['data']).decode('utf-8')
-            logging.info(f"Received Pub/Sub message: {pubsub_message}")
+            logging.debug(f"Received Pub/Sub message: {pubsub_message}")
 
         results = import_team_capacity()
         end_time = datetime.now()
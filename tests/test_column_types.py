@@ -0,0 +1,104 @@
+"""Tests for typed column conversion in main.py
+
+Run with `pip install -r src/requirements.txt pytest && pytest tests`.
+"""
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import main  # noqa: E402
+
+TYPED_CONFIG = {
+    'sheet_name': 'PM_Aggregated_Personalplanung',
+    'columns': {
+        'Year_Month': 'year_month',
+        'Stunden': {'name': 'stunden', 'type': 'INTEGER'},
+        'FTE': {'name': 'fte', 'type': 'FLOAT'},
+        'Aktiv': {'name': 'aktiv', 'type': 'BOOLEAN'}
+    }
+}
+
+
+def test_to_integer():
+    assert main.to_integer(1234) == 1234
+    assert main.to_integer(1234.0) == 1234
+    assert main.to_integer(12.5) is None
+    assert main.to_integer('1.234') is None
+    assert main.to_integer(True) is None
+
+
+def test_to_float():
+    assert main.to_float(1234) == 1234.0
+    assert main.to_float(0.125) == 0.125
+    assert main.to_float('12,5') is None
+    assert main.to_float(False) is None
+
+
+def test_to_boolean():
+    assert main.to_boolean(True) is True
+    assert main.to_boolean(False) is False
+    assert main.to_boolean(' Ja ') is True
+    assert main.to_boolean('nein') is False
+    assert main.to_boolean('vielleicht') is None
+    assert main.to_boolean(1) is True
+    assert main.to_boolean(0.0) is False
+    assert main.to_boolean(2) is None
+
+
+def test_numeric_strings_from_plain_text_cells():
+    assert main.to_integer('12') == 12
+    assert main.to_integer(' -3 ') == -3
+    assert main.to_integer('12.5') is None
+    assert main.to_float('12') == 12.0
+    assert main.to_float('0.125') == 0.125
+    assert main.to_float('abc') is None
+
+
+def test_has_typed_columns():
+    assert main.has_typed_columns(TYPED_CONFIG)
+    assert not main.has_typed_columns({'columns': {'Year_Month': 'year_month'}})
+    assert not main.has_typed_columns({'columns': {'Year_Month': {'name': 'year_month'}}})
+
+
+def test_typed_columns_use_unformatted_values():
+    # German formatting: "1.234" is one thousand two hundred thirty-four
+    value_range = {
+        'values': [['Year_Month', 'Stunden', 'FTE', 'Aktiv'], ['2024-01', '1.234', '12,5 %', 'WAHR']],
+        'unformatted_values': [['Year_Month', 'Stunden', 'FTE', 'Aktiv'], ['2024-01', 1234, 0.125, True]]
+    }
+    columns, records, row_count = main.process_sheet(value_range, TYPED_CONFIG, {'department': 'Paid Media'})
+
+    assert columns == {
+        'year_month': 'STRING', 'stunden': 'INTEGER', 'fte': 'FLOAT', 'aktiv': 'BOOLEAN', 'department': 'STRING'
+    }
+    assert list(records) == [
+        {'year_month': '2024-01', 'stunden': 1234, 'fte': 0.125, 'aktiv': True, 'department': 'Paid Media'}
+    ]
+    assert row_count == 1
+
+
+def test_blank_and_error_cells_stay_null_without_warning(caplog):
+    value_range = {
+        'values': [['Year_Month', 'Stunden', 'FTE'], ['2024-01', '', '#VALUE!']],
+        'unformatted_values': [['Year_Month', 'Stunden', 'FTE'], ['2024-01', '', '#VALUE!']]
+    }
+    _, records, _ = main.process_sheet(value_range, TYPED_CONFIG, {})
+
+    with caplog.at_level(logging.WARNING):
+        assert list(records) == [{'year_month': '2024-01', 'stunden': None, 'fte': None}]
+    assert not [r for r in caplog.records if r.levelno >= logging.WARNING]
+
+
+def test_unconvertible_values_are_logged(caplog):
+    value_range = {
+        'values': [['Year_Month', 'Stunden'], ['2024-01', 'n/a'], ['2024-02', '12,5']],
+        'unformatted_values': [['Year_Month', 'Stunden'], ['2024-01', 'n/a'], ['2024-02', 12.5]]
+    }
+    _, records, _ = main.process_sheet(value_range, TYPED_CONFIG, {})
+
+    with caplog.at_level(logging.WARNING):
+        assert [r['stunden'] for r in records] == [None, None]
+    assert "Loaded 2 values in PM_Aggregated_Personalplanung as NULL" in caplog.text
+    assert "stunden = 'n/a'" in caplog.text